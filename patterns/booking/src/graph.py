@@ -6,16 +6,41 @@ This graph models a typical booking conversation:
 2. Bot extracts information (service, date)
 3. If information is missing → ask for it
 4. If complete → check availability
-5. Confirm the booking
-6. Respond to the user
+5. If the user confirmed → finalize the booking and end the turn
+6. Otherwise → respond to the user (times, confirmation prompt or question)
 
 The flow is based on simple decisions about the conversation's state.
 """
 
+import logging
+import os
+from functools import lru_cache
+
 from langgraph.graph import StateGraph, START, END
 from src.patterns.booking.state import BookingState
-from src.patterns.booking.nodes import BookingNodes
+from src.patterns.booking.nodes import (
+    prepare_message_node,
+    detect_intent_node,
+    extract_booking_data_node,
+    check_availability_node,
+    ask_for_information_node,
+    respond_user_node,
+)
+
+logger = logging.getLogger(__name__)
+
+# Routing decisions are pure over a few booleans, so they are cached by
+# that signature (helps checkpoint resumes and retried turns)
+
+@lru_cache(maxsize=256)
+def _route_after_extraction_cached(has_service: bool, has_date: bool) -> str:
+    return "check_availability" if (has_service and has_date) else "ask_for_information"
+
+@lru_cache(maxsize=256)
+def _route_after_availability_cached(has_time: bool, user_confirmed: bool) -> str:
+    return "done" if (has_time and user_confirmed) else "respond_user"
 
+@lru_cache(maxsize=1)
 def create_booking_graph():
     """
     Creates the conversational booking graph.
@@ -24,23 +49,23 @@ def create_booking_graph():
     - Incremental information gathering
     - Availability validation
     - Final confirmation
-    """
     
-    print("🏗️ Building booking graph...")
+    The compiled graph is cached, so repeated calls reuse the same instance
+    instead of rebuilding and re-validating it.
+    """
     
-    # Initialize nodes
-    nodes = BookingNodes()
+    logger.debug("🏗️ Building booking graph...")
     
     # Create the graph
     workflow = StateGraph(BookingState)
     
     # Add all nodes
-    workflow.add_node("detect_intent", nodes.detect_intent_node)
-    workflow.add_node("extract_booking_data", nodes.extract_booking_data_node)
-    workflow.add_node("check_availability", nodes.check_availability_node)
-    workflow.add_node("confirm_booking", nodes.confirm_booking_node)
-    workflow.add_node("ask_for_information", nodes.ask_for_information_node)
-    workflow.add_node("respond_user", nodes.respond_user_node)
+    workflow.add_node("prepare_message", prepare_message_node)
+    workflow.add_node("detect_intent", detect_intent_node)
+    workflow.add_node("extract_booking_data", extract_booking_data_node)
+    workflow.add_node("check_availability", check_availability_node)
+    workflow.add_node("ask_for_information", ask_for_information_node)
+    workflow.add_node("respond_user", respond_user_node)
     
     # =========================================================================
     # ROUTING FUNCTIONS - The heart of the conversational flow
@@ -54,44 +79,50 @@ def create_booking_graph():
         - If we have service + date → check availability (with or without time)
         - If service or date is missing → ask for it
         """
-        booking_data = state.get("booking_data", {})
-        has_service = bool(booking_data.get("service"))
-        has_date = bool(booking_data.get("appointment_date"))
-        has_time = bool(booking_data.get("appointment_time"))
+        has_service = bool(state.get("service"))
+        has_date = bool(state.get("appointment_date"))
+        has_time = bool(state.get("appointment_time"))
         
-        if has_service and has_date:
-            print(f"📋 We have service + date → checking availability (time: {has_time})")
-            return "check_availability"
+        route = _route_after_extraction_cached(has_service, has_date)
+        if route == "check_availability":
+            logger.debug("📋 We have service + date → checking availability (time: %s)", has_time)
         else:
-            print(f"❓ Missing information (service: {has_service}, date: {has_date}) → asking")
-            return "ask_for_information"
+            logger.debug("❓ Missing information (service: %s, date: %s) → asking", has_service, has_date)
+        return route
     
     def route_after_availability(state: BookingState) -> str:
         """
         Decides what to do after checking availability.
         
         Logic:
-        - If we have time + user confirmed → finalize booking
+        - If we have time + user confirmed → booking was finalized, end
         - Otherwise → respond to user (showing times or asking confirmation)
         """
-        booking_data = state.get("booking_data", {})
-        has_time = bool(booking_data.get("appointment_time"))
+        has_time = bool(state.get("appointment_time"))
         user_confirmed = state.get("booking_confirmed", False)
         
-        if has_time and user_confirmed:
-            print("✅ Has time + user confirmed → finalizing booking")
-            return "confirm_booking"
+        route = _route_after_availability_cached(has_time, bool(user_confirmed))
+        if route == "done":
+            logger.debug("✅ Has time + user confirmed → booking finalized")
         else:
-            print(f"📋 No final confirmation yet (time: {has_time}, confirmed: {user_confirmed}) → responding")
-            return "respond_user"
+            logger.debug("📋 No final confirmation yet (time: %s, confirmed: %s) → responding", has_time, user_confirmed)
+        return route
     
     # =========================================================================
     # DEFINE THE GRAPH FLOW
     # =========================================================================
     
-    # Main flow: START → detect_intent → extract_booking_data
-    workflow.add_edge(START, "detect_intent")
-    workflow.add_edge("detect_intent", "extract_booking_data")
+    # Main flow: START → prepare_message → (detect_intent || extract_booking_data)
+    workflow.add_edge(START, "prepare_message")
+    
+    # Fan-out: intent detection and data extraction are independent and write
+    # disjoint keys, so they run in parallel in the same step
+    workflow.add_edge("prepare_message", "detect_intent")
+    workflow.add_edge("prepare_message", "extract_booking_data")
+    
+    # detect_intent only records the intent; its branch ends here while
+    # extract_booking_data drives the rest of the conversation
+    workflow.add_edge("detect_intent", END)
     
     # Conditional routing after extracting data
     workflow.add_conditional_edges(
@@ -103,24 +134,23 @@ def create_booking_graph():
         }
     )
     
-    # After checking availability, confirm or respond
+    # After checking availability, end (already confirmed) or respond
     workflow.add_conditional_edges(
         "check_availability",
         route_after_availability,
         {
-            "confirm_booking": "confirm_booking",
+            "done": END,
             "respond_user": "respond_user"
         }
     )
     
-    # Both confirming and asking go to respond to the user
-    workflow.add_edge("confirm_booking", "respond_user")
+    # Asking for information goes to respond to the user
     workflow.add_edge("ask_for_information", "respond_user")
     
     # The flow ends after responding
     workflow.add_edge("respond_user", END)
     
-    print("✅ Graph built successfully")
+    logger.debug("✅ Graph built successfully")
     return workflow.compile()
 
 # =========================================================================
@@ -141,7 +171,9 @@ def test_booking_conversation():
     initial_state = {
         "messages": [HumanMessage(content="Hi, I want an appointment for a haircut tomorrow")],
         "intent": None,
-        "booking_data": {},
+        "service": None,
+        "appointment_date": None,
+        "appointment_time": None,
         "booking_confirmed": False,
         "answer": None
     }
@@ -150,11 +182,12 @@ def test_booking_conversation():
     result = app.invoke(initial_state)
     print("🎯 Final result:")
     print(f"Intent: {result.get('intent')}")
-    booking_data = result.get('booking_data', {})
-    print(f"Service: {booking_data.get('service')}")
-    print(f"Date: {booking_data.get('appointment_date')}")
-    print(f"Time: {booking_data.get('appointment_time')}")
+    print(f"Service: {result.get('service')}")
+    print(f"Date: {result.get('appointment_date')}")
+    print(f"Time: {result.get('appointment_time')}")
     print(f"Confirmed: {result.get('booking_confirmed')}")
     
 if __name__ == "__main__":
+    # Node traces are logged at DEBUG; set LOG_LEVEL=DEBUG to see them
+    logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO"))
     test_booking_conversation()
@@ -2,227 +2,302 @@
 Nodes for the booking conversational flow.
 
 Each node represents a specific step in the conversation:
+- prepare_message: Normalizes the user's last message once per turn
 - detect_intent: Identifies that the user wants to make a booking
 - extract_booking_data: Extracts service and date from the user's message
-- check_availability: Checks that the date/time is available
+- check_availability: Checks that the date/time is available and
+  finalizes the booking once the user confirms
 - ask_for_information: Asks for missing data
-- confirm_booking: Confirms the booking details
 - respond_user: Sends the final response to the user
 """
 
+import logging
+import re
+from functools import lru_cache
+
 from langchain_core.messages import AIMessage
 from src.patterns.booking.state import BookingState
 
-class BookingNodes:
-    """Nodes for the booking conversational flow."""
+logger = logging.getLogger(__name__)
+
+# Compiled once at import time instead of on every extraction
+_TIME_RE = re.compile(r'\b([0-9]{1,2}):?([0-9]{2})?\b')
+
+# Keyword → (state field, value) lookup for service and date extraction
+_KEYWORDS = {
+    "haircut": ("service", "haircut"),
+    "beard": ("service", "beard trim"),
+    "styling": ("service", "styling"),
+    "day after tomorrow": ("appointment_date", "day after tomorrow"),
+    "tomorrow": ("appointment_date", "tomorrow"),
+    "today": ("appointment_date", "today"),
+}
+
+# Longest keywords first so "day after tomorrow" wins over "tomorrow"
+_KEYWORD_RE = re.compile("|".join(map(re.escape, sorted(_KEYWORDS, key=len, reverse=True))))
+
+# Whole words only, so "okay"/"yokel" don't count as a confirmation
+_CONFIRM_RE = re.compile(r'\b(?:yes|perfect|ok|confirm)\b')
+
+# Mock available times (static, so the lookup set and display text are built once)
+_AVAILABLE_TIMES = ("9:00", "10:00", "11:00", "15:00", "16:00", "17:00")
+_AVAILABLE_SET = frozenset(_AVAILABLE_TIMES)
+_AVAILABLE_TEXT = ", ".join(_AVAILABLE_TIMES)
+
+# Fixed-shape responses, filled in with str.format_map
+_CONFIRM_TMPL = "Perfect, I'm confirming your appointment:\n• Service: {service}\n• Date: {date}\n• Time: {time}\n\nDo you confirm the booking?"
+_FINAL_TMPL = "Excellent! Your {service} appointment for {date} at {time} is confirmed. See you soon! 🎉"
+_UNAVAILABLE_TMPL = "Sorry, {time} is not available on {date}. We have these times: " + _AVAILABLE_TEXT + ". Which one do you prefer?"
+_ASK_DATE_TMPL = "Perfect, a {service}. When do you need it? (today, tomorrow, day after tomorrow)"
+_TIMES_TMPL = "We have these available times for {date}: " + _AVAILABLE_TEXT + ". Which one do you prefer?"
+
+
+# Responses are pure functions of a few short strings, and the state space
+# is tiny (services × dates × times), so they are cached after first use
+
+@lru_cache(maxsize=512)
+def _build_confirm_prompt(service: str, date: str, time_: str) -> str:
+    return _CONFIRM_TMPL.format_map({"service": service, "date": date, "time": time_})
+
+
+@lru_cache(maxsize=512)
+def _build_final(service: str, date: str, time_: str) -> str:
+    return _FINAL_TMPL.format_map({"service": service, "date": date, "time": time_})
+
+
+@lru_cache(maxsize=512)
+def _build_unavailable(date: str, time_: str) -> str:
+    return _UNAVAILABLE_TMPL.format_map({"date": date, "time": time_})
+
+
+@lru_cache(maxsize=512)
+def _build_ask_date(service: str) -> str:
+    return _ASK_DATE_TMPL.format_map({"service": service})
+
+
+@lru_cache(maxsize=512)
+def _build_times(date: str) -> str:
+    return _TIMES_TMPL.format_map({"date": date})
+
+
+def _ai_message(answer: str) -> AIMessage:
+    """
+    Builds the bot's AIMessage without running Pydantic validation.
     
-    def detect_intent_node(self, state: BookingState) -> BookingState:
-        """
-        Detects the intent to book an appointment.
-        
-        In this simple demo, we assume that any conversation
-        that reaches here is a booking intent.
-        """
-        print("🎯 Detecting intent: BOOKING")
-        return {
-            **state,
-            "intent": "book"
-        }
+    Safe because `answer` is always a plain `str` produced by this module,
+    and model_construct still fills in the remaining field defaults.
+    """
+    return AIMessage.model_construct(content=answer, type="ai")
+
+
+def _final_confirmation_update(state: BookingState) -> BookingState:
+    """Builds the final "booking confirmed" message for check_availability."""
+    service = state.get("service") or "service"
+    appointment_date = state.get("appointment_date") or "date"
+    appointment_time = state.get("appointment_time") or "time"
+    logger.debug("🎉 Booking completed: %s for %s at %s", service, appointment_date, appointment_time)
     
-    def extract_booking_data_node(self, state: BookingState) -> BookingState:
-        """
-        Extracts service and date from the user's message.
-        
-        Uses simple patterns to identify:
-        - Services: "haircut", "beard trim", "styling"
-        - Dates: "today", "tomorrow", "the day after tomorrow"
-        """
-        if not state["messages"]:
-            return {**state}
-            
-        # In Studio: content[0]["text"]
-        last_message = state["messages"][-1].content[0]["text"].lower()
-        print(f"💬 Analyzing message: '{last_message}'")
-        
-        # Get existing booking data
-        booking_data = state.get("booking_data", {})
-        
-        # Simple service extraction
-        if "haircut" in last_message:
-            booking_data["service"] = "haircut"
-            print("✂️ Service detected: haircut")
-        elif "beard" in last_message:
-            booking_data["service"] = "beard trim"
-            print("🧔 Service detected: beard trim")
-        elif "styling" in last_message:
-            booking_data["service"] = "styling"
-            print("💇 Service detected: styling")
-            
-        # Simple date extraction
-        if "today" in last_message:
-            booking_data["appointment_date"] = "today"
-            print("📅 Date detected: today")
-        elif "tomorrow" in last_message:
-            booking_data["appointment_date"] = "tomorrow"
-            print("📅 Date detected: tomorrow")
-        elif "day after tomorrow" in last_message:
-            booking_data["appointment_date"] = "day after tomorrow"
-            print("📅 Date detected: day after tomorrow")
-            
-        # Simple time extraction
-        import re
-        time_pattern = r'\b([0-9]{1,2}):?([0-9]{2})?\b'
-        time_match = re.search(time_pattern, last_message)
-        if time_match:
-            hour = time_match.group(1)
-            minute = time_match.group(2) or "00"
-            booking_data["appointment_time"] = f"{hour}:{minute}"
-            print(f"🕐 Time detected: {booking_data['appointment_time']}")
-        
-        # Confirmation extraction - Only if we already have complete booking data
-        booking_confirmed = state.get("booking_confirmed", False)
-        has_service = bool(booking_data.get("service"))
-        has_date = bool(booking_data.get("appointment_date"))
-        has_time = bool(booking_data.get("appointment_time"))
-        
-        # Only confirm if we have all the data AND user says yes
-        if has_service and has_date and has_time:
-            confirmation_words = ["yes", "perfect", "ok", "confirm"]
-            if any(word in last_message for word in confirmation_words):
-                booking_confirmed = True
-                print("✅ Final confirmation detected with complete data")
-        
-        return {
-            **state,
-            "booking_data": booking_data,
-            "booking_confirmed": booking_confirmed
-        }
+    return {
+        "messages": [_ai_message(_build_final(service, appointment_date, appointment_time))],
+        "answer": None
+    }
+
+
+# Booking fields extraction reads and writes; part of the replay signature
+_EXTRACT_FIELDS = ("service", "appointment_date", "appointment_time", "booking_confirmed")
+
+
+def _extract_signature(message: str, fields: BookingState) -> dict:
+    """Message plus the booking fields, keyed by name, used to detect replays."""
+    signature = {"message": message}
+    signature.update({field: fields.get(field) for field in _EXTRACT_FIELDS})
+    return signature
+
+
+def prepare_message_node(state: BookingState) -> BookingState:
+    """
+    Lowercases the user's last message once per turn.
     
-    def check_availability_node(self, state: BookingState) -> BookingState:
-        """
-        Checks availability for the requested date/time.
+    Downstream nodes read `_last_user_lower` instead of re-indexing
+    and re-lowercasing the message content themselves.
+    """
+    if not state["messages"]:
+        return {"_last_user_lower": None}
+    
+    # In Studio: content[0]["text"]
+    last_message = state["messages"][-1].content[0]["text"].lower()
+    return {
+        "_last_user_lower": last_message
+    }
+
+
+def detect_intent_node(state: BookingState) -> BookingState:
+    """
+    Detects the intent to book an appointment.
+    
+    In this simple demo, we assume that any conversation
+    that reaches here is a booking intent.
+    """
+    logger.debug("🎯 Detecting intent: BOOKING")
+    return {
+        "intent": "book"
+    }
+
+
+def extract_booking_data_node(state: BookingState) -> BookingState:
+    """
+    Extracts service and date from the user's message.
+    
+    Uses simple patterns to identify:
+    - Services: "haircut", "beard trim", "styling"
+    - Dates: "today", "tomorrow", "the day after tomorrow"
+    """
+    last_message = state.get("_last_user_lower")
+    if not last_message:
+        return {}
+    
+    # Skip work on exact replays (duplicate message, retries, resumes), but
+    # only if state still holds everything the last extraction wrote. Other
+    # nodes may have changed those fields since (e.g. a rejected time is
+    # cleared), and then the message has to be extracted again.
+    if state.get("_last_extract") == _extract_signature(last_message, state):
+        logger.debug("♻️ Same message and state as last extraction → skipping")
+        return {}
         
-        If no time is provided: returns available times for the day.
-        If time is provided and available: asks for confirmation.
-        If time is provided and NOT available: shows available times.
-        """
-        booking_data = state.get("booking_data", {})
-        service = booking_data.get("service", "service")
-        appointment_date = booking_data.get("appointment_date", "date")
-        appointment_time = booking_data.get("appointment_time")
+    logger.debug("💬 Analyzing message: '%s'", last_message)
+    
+    # Single-pass keyword extraction (service + date)
+    detected = {}
+    for match in _KEYWORD_RE.finditer(last_message):
+        field, value = _KEYWORDS[match.group(0)]
+        detected.setdefault(field, value)  # First mention of each field wins
+    
+    if "service" in detected:
+        logger.debug("✂️ Service detected: %s", detected["service"])
+    if "appointment_date" in detected:
+        logger.debug("📅 Date detected: %s", detected["appointment_date"])
         
-        # Mock available times
-        available_times = ["9:00", "10:00", "11:00", "15:00", "16:00", "17:00"]
+    # Simple time extraction (the compiled regex beats a hand-rolled
+    # character scan in CPython, so it stays the only path)
+    time_match = _TIME_RE.search(last_message)
+    if time_match:
+        hour, minute = time_match.groups("00")  # Missing minutes default to "00"
+        detected["appointment_time"] = f"{hour}:{minute}"
+        logger.debug("🕐 Time detected: %s", detected["appointment_time"])
+    
+    # Confirmation extraction - Only if we already have complete booking data
+    booking_confirmed = state.get("booking_confirmed", False)
+    has_service = bool(detected.get("service") or state.get("service"))
+    has_date = bool(detected.get("appointment_date") or state.get("appointment_date"))
+    has_time = bool(detected.get("appointment_time") or state.get("appointment_time"))
+    
+    # Only confirm if we have all the data AND user says yes
+    if has_service and has_date and has_time and _CONFIRM_RE.search(last_message):
+        booking_confirmed = True
+        logger.debug("✅ Final confirmation detected with complete data")
+    
+    # Only the fields found in this message are written
+    result = {**detected, "booking_confirmed": booking_confirmed}
+    
+    # Record the message and the resulting booking fields, so a replay is
+    # only skipped while state still matches this extraction's output
+    result["_last_extract"] = _extract_signature(last_message, {**state, **result})
+    return result
+
+
+def check_availability_node(state: BookingState) -> BookingState:
+    """
+    Checks availability for the requested date/time.
+    
+    If no time is provided: returns available times for the day.
+    If time is provided and available: asks for confirmation, or
+    finalizes the booking if the user already confirmed.
+    If time is provided and NOT available: shows available times.
+    """
+    service = state.get("service") or "service"
+    appointment_date = state.get("appointment_date") or "date"
+    appointment_time = state.get("appointment_time")
+    
+    if appointment_time:
+        # Check specific time
+        logger.debug("📋 Checking availability for %s on %s at %s", service, appointment_date, appointment_time)
         
-        if appointment_time:
-            # Check specific time
-            print(f"📋 Checking availability for {service} on {appointment_date} at {appointment_time}")
+        if appointment_time in _AVAILABLE_SET:
+            if state.get("booking_confirmed"):
+                # Time available + user confirmed → Finalize booking.
+                # The message is emitted here so the graph can go
+                # straight to END without a respond_user hop.
+                return _final_confirmation_update(state)
             
-            if appointment_time in available_times:
-                # Time available → Ask for confirmation
-                print("✅ Time available → asking for confirmation")
-                answer = f"Perfect, I'm confirming your appointment:\n• Service: {service}\n• Date: {appointment_date}\n• Time: {appointment_time}\n\nDo you confirm the booking?"
-                
-                return {
-                    **state,
-                    "answer": answer
-                }
-            else:
-                # Time NOT available → Show alternatives
-                print("❌ Time not available → showing alternatives")
-                times_text = ", ".join(available_times)
-                answer = f"Sorry, {appointment_time} is not available on {appointment_date}. We have these times: {times_text}. Which one do you prefer?"
-                
-                # Reset time so they can choose another one
-                updated_booking_data = {**booking_data}
-                updated_booking_data.pop("appointment_time", None)
-                
-                return {
-                    **state,
-                    "booking_data": updated_booking_data,
-                    "answer": answer
-                }
-        else:
-            # No time provided → Show available times
-            print(f"📋 Checking available times for {appointment_date}")
-            times_text = ", ".join(available_times)
-            answer = f"We have these available times for {appointment_date}: {times_text}. Which one do you prefer?"
-            print(f"🕐 Showing times: {times_text}")
+            # Time available → Ask for confirmation
+            logger.debug("✅ Time available → asking for confirmation")
+            answer = _build_confirm_prompt(service, appointment_date, appointment_time)
             
             return {
-                **state,
                 "answer": answer
             }
-    
-    def ask_for_information_node(self, state: BookingState) -> BookingState:
-        """
-        Asks for missing information.
-        
-        Identifies which data is missing and asks the appropriate question.
-        """
-        booking_data = state.get("booking_data", {})
-        
-        if not booking_data.get("service"):
-            answer = "Hi! What service do you need? We have haircut, beard trim, and styling."
-            print("❓ Asking for service")
-        elif not booking_data.get("appointment_date"):
-            answer = f"Perfect, a {booking_data['service']}. When do you need it? (today, tomorrow, day after tomorrow)"
-            print("❓ Asking for date")
         else:
-            # If we get here, we have service + date but the routing failed
-            answer = "Could you give me more details about your booking?"
-            print("❓ Unexpected case - we have service + date but are in ask_for_information")
+            # Time NOT available → Show alternatives
+            logger.debug("❌ Time not available → showing alternatives")
+            answer = _build_unavailable(appointment_date, appointment_time)
             
-        return {
-            **state,
-            "answer": answer
-        }
-    
-    def confirm_booking_node(self, state: BookingState) -> BookingState:
-        """
-        Handles the final confirmation when the user says "yes/perfect".
-        
-        Only generates the final success message.
-        """
-        booking_data = state.get("booking_data", {})
-        service = booking_data.get("service", "service")
-        appointment_date = booking_data.get("appointment_date", "date")
-        appointment_time = booking_data.get("appointment_time", "time")
-        
-        answer = f"Excellent! Your {service} appointment for {appointment_date} at {appointment_time} is confirmed. See you soon! 🎉"
-        print(f"🎉 Booking completed: {service} for {appointment_date} at {appointment_time}")
+            # Reset time so they can choose another one
+            return {
+                "appointment_time": None,
+                "answer": answer
+            }
+    else:
+        # No time provided → Show available times
+        logger.debug("📋 Checking available times for %s", appointment_date)
+        answer = _build_times(appointment_date)
+        logger.debug("🕐 Showing times: %s", _AVAILABLE_TEXT)
         
         return {
-            **state,
             "answer": answer
         }
+
+
+def ask_for_information_node(state: BookingState) -> BookingState:
+    """
+    Asks for missing information.
     
-    def respond_user_node(self, state: BookingState) -> BookingState:
-        """
-        Converts the answer field to an AIMessage and adds it to messages.
-        
-        Centralized function for all bot responses.
-        """
-        # Use answer from state if it exists, otherwise use a default fallback
-        answer = state.get("answer")
+    Identifies which data is missing and asks the appropriate question.
+    """
+    service = state.get("service")
+    
+    if not service:
+        answer = "Hi! What service do you need? We have haircut, beard trim, and styling."
+        logger.debug("❓ Asking for service")
+    elif not state.get("appointment_date"):
+        answer = _build_ask_date(service)
+        logger.debug("❓ Asking for date")
+    else:
+        # If we get here, we have service + date but the routing failed
+        answer = "Could you give me more details about your booking?"
+        logger.debug("❓ Unexpected case - we have service + date but are in ask_for_information")
         
-        if not answer:
-            # Fallback based on state
-            if state.get("booking_confirmed"):
-                booking_data = state.get("booking_data", {})
-                service = booking_data.get("service", "service")
-                appointment_date = booking_data.get("appointment_date", "date")
-                appointment_time = booking_data.get("appointment_time", "time")
-                answer = f"Excellent! Your {service} appointment for {appointment_date} at {appointment_time} is confirmed. See you soon! 🎉"
-                print("🎉 Booking completed successfully")
-            else:
-                answer = "How else can I help you today?"
-                print("💭 Using fallback response")
+    return {
+        "answer": answer
+    }
+
+
+def respond_user_node(state: BookingState) -> BookingState:
+    """
+    Converts the answer field to an AIMessage and adds it to messages.
+    
+    Centralized function for all bot responses except the final
+    confirmation, which check_availability emits before going to END.
+    """
+    # Use answer from state if it exists, otherwise use a default fallback
+    answer = state.get("answer")
+    
+    if not answer:
+        answer = "How else can I help you today?"
+        logger.debug("💭 Using fallback response")
+    
+    logger.debug("💬 Sending response: %.50s...", answer)
         
-        print(f"💬 Sending response: {answer[:50]}...")
-            
-        return {
-            **state,
-            "messages": state["messages"] + [AIMessage(content=answer)],
-            "answer": None  # Clear answer after using it
-        }
+    return {
+        "messages": [_ai_message(answer)],  # add_messages appends it
+        "answer": None  # Clear answer after using it
+    }
@@ -0,0 +1,36 @@
+"""
+Multi-turn tests for the booking conversational graph.
+"""
+
+from langchain_core.messages import HumanMessage
+from src.patterns.booking.graph import create_booking_graph
+
+
+def _user(text):
+    # Same content shape LangGraph Studio sends: content[0]["text"]
+    return HumanMessage(content=[{"type": "text", "text": text}])
+
+
+def _run_turns(texts):
+    """Runs each text as a new user turn, carrying state between turns."""
+    app = create_booking_graph()
+    state = {"messages": []}
+    answers = []
+    for text in texts:
+        state = app.invoke({**state, "messages": state["messages"] + [_user(text)]})
+        answers.append(state["messages"][-1].content)
+    return answers
+
+
+def test_repeated_rejected_time_is_rejected_again():
+    answers = _run_turns(["haircut tomorrow", "at 20", "at 20"])
+
+    assert answers[1].startswith("Sorry, 20:00 is not available on tomorrow.")
+    assert answers[2] == answers[1]
+
+
+def test_repeated_full_request_with_rejected_time():
+    answers = _run_turns(["haircut tomorrow at 12"] * 3)
+
+    for answer in answers:
+        assert answer.startswith("Sorry, 12:00 is not available on tomorrow.")